@@ -0,0 +1,129 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import BooleanField, Count, Sum, Value
+
+from .models import Product, ArchivedProduct
+from .rollups import paused_rollups
+
+
+ARCHIVE_BATCH_SIZE = 1000
+
+
+def wants_archived(request):
+    """True when the request opted in with ?include_archived=1."""
+    return request.GET.get('include_archived') in ('1', 'true', 'on')
+
+
+class MergedProducts:
+    """
+    Hot and archived products of one user as a single newest-first sequence.
+
+    Wraps a UNION of both tables so counting and slicing (and hence
+    pagination) stay in SQL, but hands back real Product or ArchivedProduct
+    instances, so an archived row can never be saved or deleted through a
+    hot pk. Every instance carries an `is_archived` flag.
+    """
+
+    fields = ['id', 'name', 'quantity', 'weight_unit', 'amount', 'user_id', 'date_added']
+
+    def __init__(self, hot, cold):
+        hot = hot.annotate(is_archived=Value(False, output_field=BooleanField())).order_by()
+        cold = cold.annotate(is_archived=Value(True, output_field=BooleanField())).order_by()
+        self.queryset = (
+            hot.values(*self.fields, 'is_archived')
+            .union(cold.values(*self.fields, 'is_archived'), all=True)
+            .order_by('-date_added', '-id')
+        )
+
+    def _instance(self, row):
+        is_archived = bool(row.pop('is_archived'))
+        product = (ArchivedProduct if is_archived else Product)(**row)
+        product.is_archived = is_archived
+        return product
+
+    def count(self):
+        return self.queryset.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self._instance(row) for row in self.queryset[key]]
+        return self._instance(self.queryset[key])
+
+    def __iter__(self):
+        return self.iterator()
+
+    def iterator(self):
+        for row in self.queryset.iterator():
+            yield self._instance(row)
+
+
+def user_products(user, include_archived=False, filters=None):
+    """
+    Products owned by `user`, newest first.
+
+    By default only the hot Product table is queried and a queryset is
+    returned. With include_archived the archive table is merged in through
+    MergedProducts. Either way every row carries an `is_archived` flag.
+    """
+    hot = Product.objects.filter(user=user)
+    if filters is not None:
+        hot = hot.filter(filters)
+    if not include_archived:
+        return hot.annotate(is_archived=Value(False, output_field=BooleanField())).order_by('-date_added')
+
+    cold = ArchivedProduct.objects.filter(user=user)
+    if filters is not None:
+        cold = cold.filter(filters)
+    return MergedProducts(hot, cold)
+
+
+def user_product_totals(user, include_archived=False):
+    """
+    (count, total amount) for the products `user_products` would return,
+    computed with one aggregate query per source table.
+    """
+    sources = [Product, ArchivedProduct] if include_archived else [Product]
+    count, amount = 0, Decimal('0')
+    for model in sources:
+        totals = model.objects.filter(user=user).aggregate(count=Count('pk'), amount=Sum('amount'))
+        count += totals['count']
+        amount += totals['amount'] or Decimal('0')
+    return count, amount
+
+
+def archive_products(cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Move every Product added before `cutoff` into ArchivedProduct.
+
+    Rows are copied and deleted in batches of `batch_size`, each batch in its
+    own transaction, so a large backlog never holds a long write lock and an
+    interrupted run can simply be started again. Rollups are left alone since
+    they count archived spending too. Returns the number of rows moved.
+    """
+    moved = 0
+    while True:
+        with transaction.atomic(), paused_rollups():
+            batch = list(
+                Product.objects.filter(date_added__lt=cutoff)
+                .order_by('date_added', 'pk')[:batch_size]
+            )
+            if not batch:
+                break
+            ArchivedProduct.objects.bulk_create([
+                ArchivedProduct(
+                    name=p.name,
+                    quantity=p.quantity,
+                    weight_unit=p.weight_unit,
+                    amount=p.amount,
+                    user_id=p.user_id,
+                    date_added=p.date_added,
+                )
+                for p in batch
+            ])
+            Product.objects.filter(pk__in=[p.pk for p in batch]).delete()
+        moved += len(batch)
+    return moved
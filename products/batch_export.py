@@ -0,0 +1,54 @@
+"""
+Worker entry points for the export_all_users command.
+
+Spawned and forkserver workers import this module before Django is set
+up, so nothing here may touch models or settings at import time.
+"""
+import os
+from pathlib import Path
+
+
+def init_worker():
+    # Spawned workers start without Django loaded; forked ones inherit the
+    # parent's connection, which must not be shared, so each worker drops it
+    # and opens its own on first query.
+    import django
+    from django.apps import apps
+    from django.db import connections
+
+    if not apps.ready:
+        django.setup()
+    connections.close_all()
+
+
+def export_user(user_id, output_dir, formats, stamp, include_archived):
+    """Write one user's exports; returns (username, rows, files written)."""
+    from django.contrib.auth import get_user_model
+
+    from .archive import user_product_totals, user_products
+    from .exports import write_products_excel, write_products_pdf
+
+    writers = {
+        'pdf': write_products_pdf,
+        'xlsx': write_products_excel,
+    }
+    user = get_user_model().objects.get(pk=user_id)
+    total_count, total_amount = user_product_totals(user, include_archived=include_archived)
+    written = []
+    for fmt in formats:
+        path = Path(output_dir) / f'products_{user.username}_{stamp}.{fmt}'
+        if path.exists():
+            continue
+        # Write under a temporary name and rename when complete, so a crash
+        # never leaves a half-written file that a resumed run would skip.
+        partial = path.with_name(path.name + '.part')
+        products = user_products(user, include_archived=include_archived).iterator()
+        try:
+            with open(partial, 'wb') as out:
+                writers[fmt](out, products, total_count, total_amount)
+        except BaseException:
+            partial.unlink(missing_ok=True)
+            raise
+        os.replace(partial, path)
+        written.append(path.name)
+    return user.username, total_count if written else 0, written
@@ -0,0 +1,228 @@
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Product, ProductNameGram
+
+
+DEFAULT_THRESHOLD = 0.75
+
+_NON_WORD = re.compile(r'[^a-z0-9.]+')
+# A dot only survives inside a number ("1.5kg"); "Dr." and "1kg." lose it.
+_STRAY_DOT = re.compile(r'(?<!\d)\.|\.(?!\d)')
+_NUMBER_UNIT = re.compile(r'(\d+(?:\.\d+)?) (g|kg|ml|l|packet)\b')
+_QUANTITY = re.compile(r'^\d+(?:\.\d+)?(?:g|kg|ml|l|packet)?$')
+
+
+def normalize_name(name):
+    """Lower-case, drop punctuation and glue quantities to units ("1 kg" -> "1kg")."""
+    text = _STRAY_DOT.sub(' ', _NON_WORD.sub(' ', name.lower()))
+    text = ' '.join(text.split())
+    return _NUMBER_UNIT.sub(r'\1\2', text)
+
+
+def split_name(name):
+    """
+    Split a normalised name into (words, quantity tokens).
+
+    Quantities such as "1kg" or "500" differ by a character or two between
+    genuinely different items, so they are compared exactly instead of
+    through trigrams.
+    """
+    words, quantities = [], set()
+    for token in normalize_name(name).split():
+        if _QUANTITY.match(token):
+            quantities.add(token)
+        else:
+            words.append(token)
+    return words, frozenset(quantities)
+
+
+def name_grams(name):
+    """Set of padded word trigrams for `name` (quantities left out), as used by pg_trgm."""
+    grams = set()
+    for word in split_name(name)[0]:
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def name_quantities(name):
+    return split_name(name)[1]
+
+
+def similarity(shared, size_a, size_b):
+    """Dice coefficient from the shared gram count and both set sizes."""
+    if not size_a or not size_b:
+        return 0.0
+    return 2.0 * shared / (size_a + size_b)
+
+
+def is_duplicate_name(name_a, name_b, threshold=DEFAULT_THRESHOLD):
+    """True when two names have the same quantities and similar words."""
+    if name_quantities(name_a) != name_quantities(name_b):
+        return False
+    grams_a, grams_b = name_grams(name_a), name_grams(name_b)
+    return similarity(len(grams_a & grams_b), len(grams_a), len(grams_b)) >= threshold
+
+
+def quantity_key(quantity, weight_unit, name):
+    """
+    Everything two duplicates must match exactly: the quantity and unit
+    fields plus any quantities written into the name. Decimal equality
+    makes 1 and 1.00 the same quantity.
+    """
+    return quantity, weight_unit, name_quantities(name)
+
+
+def product_key(product):
+    return quantity_key(product.quantity, product.weight_unit, product.name)
+
+
+def is_duplicate(product_a, product_b, threshold=DEFAULT_THRESHOLD):
+    """True when two products have the same quantity and unit and similar names."""
+    return (product_key(product_a) == product_key(product_b)
+            and is_duplicate_name(product_a.name, product_b.name, threshold))
+
+
+def index_product(product):
+    """Replace the stored trigrams for `product` with ones for its current name."""
+    with transaction.atomic():
+        ProductNameGram.objects.filter(product=product).delete()
+        ProductNameGram.objects.bulk_create([
+            ProductNameGram(product=product, user_id=product.user_id, gram=gram)
+            for gram in name_grams(product.name)
+        ])
+
+
+def find_similar(user, name, quantity, weight_unit, exclude_pk=None, threshold=DEFAULT_THRESHOLD, limit=5):
+    """
+    Products of `user` that look like `quantity` `weight_unit` of `name`,
+    best match first.
+
+    Uses the trigram index only: one grouped query finds products sharing
+    enough grams to possibly reach `threshold`, a second fetches their gram
+    totals. Candidates whose quantity key differs are dropped. Returns a
+    list of (product, score) pairs.
+    """
+    grams = name_grams(name)
+    if not grams:
+        return []
+
+    # Dice >= threshold needs at least threshold * |grams| / 2 shared grams.
+    min_shared = max(1, int(threshold * len(grams) / 2))
+    rows = ProductNameGram.objects.filter(user=user, gram__in=grams)
+    if exclude_pk is not None:
+        rows = rows.exclude(product_id=exclude_pk)
+    shared = dict(
+        rows.values('product_id')
+        .annotate(shared=Count('id'))
+        .filter(shared__gte=min_shared)
+        .values_list('product_id', 'shared')
+    )
+    if not shared:
+        return []
+
+    totals = dict(
+        ProductNameGram.objects.filter(product_id__in=shared)
+        .values('product_id')
+        .annotate(total=Count('id'))
+        .values_list('product_id', 'total')
+    )
+    scores = {
+        pk: similarity(count, len(grams), totals[pk])
+        for pk, count in shared.items()
+    }
+    matches = sorted(
+        (pk for pk, score in scores.items() if score >= threshold),
+        key=lambda pk: -scores[pk],
+    )
+    products = Product.objects.in_bulk(matches)
+    key = quantity_key(quantity, weight_unit, name)
+    return [
+        (products[pk], scores[pk]) for pk in matches
+        if pk in products and product_key(products[pk]) == key
+    ][:limit]
+
+
+def cluster_duplicates(user, threshold=DEFAULT_THRESHOLD):
+    """
+    Group the products of `user` into clusters of likely duplicates.
+
+    Candidates come from prefix filtering rather than comparing every pair:
+    each product's grams are ordered rarest first and only the shortest
+    prefix that any match at `threshold` must share is indexed, so common
+    words like "rice" or "kg" never produce long candidate lists. Every
+    candidate pair with the same quantity key is then scored on its full
+    gram sets, and matches are joined with union-find. Returns a list of
+    clusters (lists of product pks, oldest first), only those with two or
+    more members.
+    """
+    grams_by_product = defaultdict(set)
+    for pk, gram in ProductNameGram.objects.filter(user=user).values_list('product_id', 'gram'):
+        grams_by_product[pk].add(gram)
+    keys = {
+        pk: quantity_key(quantity, weight_unit, name)
+        for pk, name, quantity, weight_unit in Product.objects.filter(pk__in=grams_by_product)
+        .values_list('pk', 'name', 'quantity', 'weight_unit')
+    }
+    frequency = Counter(gram for grams in grams_by_product.values() for gram in grams)
+
+    # Dice >= t implies Jaccard >= t / (2 - t), and two sets with Jaccard >= j
+    # share a gram within their first |x| - ceil(j * |x|) + 1 rarest grams.
+    jaccard = threshold / (2 - threshold)
+    parent = {pk: pk for pk in grams_by_product}
+
+    def find(pk):
+        while parent[pk] != pk:
+            parent[pk] = parent[parent[pk]]
+            pk = parent[pk]
+        return pk
+
+    postings = defaultdict(list)
+    for pk in sorted(grams_by_product):
+        grams = grams_by_product[pk]
+        ordered = sorted(grams, key=lambda gram: (frequency[gram], gram))
+        prefix = ordered[:len(ordered) - math.ceil(jaccard * len(ordered) - 1e-9) + 1]
+        candidates = set()
+        for gram in prefix:
+            candidates.update(postings[gram])
+            postings[gram].append(pk)
+        for other in candidates:
+            if keys.get(other) != keys.get(pk):
+                continue
+            other_grams = grams_by_product[other]
+            if similarity(len(grams & other_grams), len(grams), len(other_grams)) >= threshold:
+                parent[find(other)] = find(pk)
+
+    clusters = defaultdict(list)
+    for pk in sorted(grams_by_product):
+        clusters[find(pk)].append(pk)
+    return [members for members in clusters.values() if len(members) > 1]
+
+
+def merge_products(keep, duplicates, threshold=DEFAULT_THRESHOLD):
+    """
+    Merge duplicate entries into `keep` by deleting them.
+
+    Duplicates are repeat entries of the same purchase, so nothing is added
+    to `keep` and their spending leaves the rollups with them. Every product
+    in the `duplicates` queryset must belong to `keep`'s user and pass
+    `is_duplicate` against it; otherwise ValueError is raised and
+    nothing is deleted. Returns the number of products removed.
+    """
+    with transaction.atomic():
+        products = list(duplicates.exclude(pk=keep.pk).select_for_update())
+        rejected = [
+            product for product in products
+            if product.user_id != keep.user_id
+            or not is_duplicate(keep, product, threshold)
+        ]
+        if rejected:
+            names = ', '.join(f'"{product.name}"' for product in rejected)
+            raise ValueError(f'Not a duplicate of "{keep.name}": {names}')
+        _, deleted = Product.objects.filter(pk__in=[product.pk for product in products]).delete()
+    return deleted.get(Product._meta.label, 0)
@@ -0,0 +1,167 @@
+from datetime import datetime
+from itertools import islice
+
+import openpyxl
+from openpyxl.styles import Font, PatternFill, Alignment
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Table, TableStyle, Paragraph
+
+
+# Each page holds a fixed number of fixed-height rows, so layout work is
+# per page and never grows with the size of the catalog.
+PDF_ROWS_PER_PAGE = 30
+PDF_ROW_HEIGHT = 18
+PDF_HEADER_HEIGHT = 30
+PDF_MARGIN = 72
+PDF_COL_WIDTHS = [150, 100, 100, 120]
+PDF_HEADERS = ['Product Name', 'Quantity', 'Amount (Rs.)', 'Date Added']
+
+_styles = getSampleStyleSheet()
+
+PDF_TITLE_STYLE = ParagraphStyle(
+    'CustomTitle',
+    parent=_styles['Heading1'],
+    fontSize=16,
+    textColor=colors.HexColor('#1f77b4'),
+    spaceAfter=20,
+    alignment=1
+)
+
+PDF_SUMMARY_STYLE = ParagraphStyle(
+    'Summary',
+    parent=_styles['Normal'],
+    fontSize=10,
+    textColor=colors.grey,
+)
+
+PDF_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1f77b4')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f0f0f0')])
+])
+
+
+def product_row(product):
+    return [
+        product.name,
+        product.get_weight_display(),
+        f"{product.amount}",
+        product.date_added.strftime('%b %d, %Y')
+    ]
+
+
+def write_products_pdf(out, products, total_count, total_amount):
+    """
+    Render `products` as a PDF table into the binary file object `out`.
+
+    `products` is consumed once, PDF_ROWS_PER_PAGE rows at a time, and each
+    chunk is laid out as its own fixed-height table and drawn as one page,
+    so layout work per page is constant and rows are never all materialised
+    as flowables. The finished pages themselves are kept (compressed) by
+    reportlab until `save()`, so memory still grows with the page count, at
+    roughly half a kilobyte per row. Totals are passed in (normally from a DB
+    aggregate) rather than summed here.
+    """
+    width, height = letter
+    pdf = canvas.Canvas(out, pagesize=letter)
+    frame_width = width - 2 * PDF_MARGIN
+    top = height - PDF_MARGIN
+
+    title = Paragraph("AFC Bank Supermarket Products", PDF_TITLE_STYLE)
+    _, title_height = title.wrap(frame_width, top)
+    title.drawOn(pdf, PDF_MARGIN, top - title_height)
+    y = top - title_height - PDF_TITLE_STYLE.spaceAfter
+
+    rows = iter(products)
+    chunk = [product_row(product) for product in islice(rows, PDF_ROWS_PER_PAGE)]
+    while True:
+        table = Table(
+            [PDF_HEADERS] + chunk,
+            colWidths=PDF_COL_WIDTHS,
+            rowHeights=[PDF_HEADER_HEIGHT] + [PDF_ROW_HEIGHT] * len(chunk),
+        )
+        table.setStyle(PDF_TABLE_STYLE)
+        _, table_height = table.wrap(frame_width, y - PDF_MARGIN)
+        table.drawOn(pdf, PDF_MARGIN + (frame_width - sum(PDF_COL_WIDTHS)) / 2, y - table_height)
+        y -= table_height
+        chunk = [product_row(product) for product in islice(rows, PDF_ROWS_PER_PAGE)]
+        if not chunk:
+            break
+        pdf.showPage()
+        y = top
+
+    summary = [
+        Paragraph(f"<b>Total Products:</b> {total_count}", PDF_SUMMARY_STYLE),
+        Paragraph(f"<b>Total Value:</b> Rs. {total_amount:.2f}", PDF_SUMMARY_STYLE),
+        Paragraph(f"<b>Generated on:</b> {datetime.now().strftime('%B %d, %Y %I:%M %p')}", PDF_SUMMARY_STYLE),
+    ]
+    y -= 20
+    summary_height = sum(p.wrap(frame_width, height)[1] for p in summary)
+    if y - summary_height < PDF_MARGIN:
+        pdf.showPage()
+        y = top
+    for paragraph in summary:
+        _, h = paragraph.wrap(frame_width, height)
+        paragraph.drawOn(pdf, PDF_MARGIN, y - h)
+        y -= h
+
+    pdf.showPage()
+    pdf.save()
+
+
+def write_products_excel(out, products, total_count, total_amount):
+    """Write `products` and a totals footer as an .xlsx workbook into `out`."""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Products"
+    
+    # Add headers
+    ws.append(PDF_HEADERS)
+    
+    # Style headers
+    header_fill = PatternFill(start_color='1f77b4', end_color='1f77b4', fill_type='solid')
+    header_font = Font(bold=True, color='FFFFFF', size=12)
+    
+    for cell in ws[1]:
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = Alignment(horizontal='center', vertical='center')
+    
+    # Add data
+    for product in products:
+        ws.append([
+            product.name,
+            product.get_weight_display(),
+            float(product.amount),
+            product.date_added.strftime('%b %d, %Y')
+        ])
+    
+    # Format columns
+    ws.column_dimensions['A'].width = 25
+    ws.column_dimensions['B'].width = 15
+    ws.column_dimensions['C'].width = 15
+    ws.column_dimensions['D'].width = 15
+    
+    # Add summary section
+    summary_row = ws.max_row + 2
+    ws[f'A{summary_row}'] = 'Total Products:'
+    ws[f'B{summary_row}'] = total_count
+    
+    ws[f'A{summary_row + 1}'] = 'Total Value (Rs.):'
+    ws[f'B{summary_row + 1}'] = float(total_amount)
+    
+    # Make summary bold
+    for row in ws[summary_row:summary_row + 1]:
+        for cell in row:
+            cell.font = Font(bold=True)
+    
+    wb.save(out)
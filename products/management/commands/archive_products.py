@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from products.archive import ARCHIVE_BATCH_SIZE, archive_products
+
+
+class Command(BaseCommand):
+    help = 'Move products older than the given number of days into the archive table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, required=True, metavar='DAYS',
+                            help='Archive products added more than DAYS days ago')
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE,
+                            help=f'Rows moved per transaction (default {ARCHIVE_BATCH_SIZE})')
+
+    def handle(self, *args, **options):
+        if options['older_than'] < 0:
+            raise CommandError('--older-than must be zero or more days')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        cutoff = timezone.now() - timedelta(days=options['older_than'])
+        moved = archive_products(cutoff, batch_size=options['batch_size'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully archived {moved} product(s) added before {cutoff:%Y-%m-%d %H:%M}')
+        )
@@ -0,0 +1,95 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from products.batch_export import export_user, init_worker
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Write PDF/XLSX product exports for every user in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output_dir', help='Directory to write the exports into')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Number of worker processes (default: number of CPUs); '
+                                 '1 runs in this process')
+        parser.add_argument('--start-method', choices=['spawn', 'forkserver', 'fork'], default='spawn',
+                            help='How worker processes are started (default spawn)')
+        parser.add_argument('--format', choices=['pdf', 'xlsx', 'both'], default='both',
+                            help='Export format (default both)')
+        parser.add_argument('--include-archived', action='store_true',
+                            help='Include archived products in the exports')
+        parser.add_argument('--date', default=None, metavar='YYYYMMDD',
+                            help='Date stamp for file names (default today); rerun with the '
+                                 'same stamp to resume after a failure')
+
+    def run_serial(self, user_ids, args):
+        for user_id in user_ids:
+            try:
+                yield user_id, export_user(user_id, *args), None
+            except Exception as exc:
+                yield user_id, None, exc
+
+    def run_parallel(self, user_ids, args, workers, start_method):
+        # Workers must not inherit an open connection from this process.
+        connections.close_all()
+        context = multiprocessing.get_context(start_method)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker) as pool:
+            futures = {pool.submit(export_user, user_id, *args): user_id for user_id in user_ids}
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result(), None
+                except Exception as exc:
+                    yield futures[future], None, exc
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+
+        output_dir = Path(options['output_dir'])
+        output_dir.mkdir(parents=True, exist_ok=True)
+        formats = ['pdf', 'xlsx'] if options['format'] == 'both' else [options['format']]
+        stamp = options['date'] or timezone.localdate().strftime('%Y%m%d')
+        export_args = (str(output_dir), formats, stamp, options['include_archived'])
+
+        user_ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+        if options['workers'] == 1:
+            results = self.run_serial(user_ids, export_args)
+        else:
+            results = self.run_parallel(user_ids, export_args, options['workers'], options['start_method'])
+
+        started = time.perf_counter()
+        exported = rows = 0
+        failed = []
+        for user_id, result, exc in results:
+            if exc is not None:
+                failed.append(user_id)
+                self.stderr.write(f'User #{user_id} failed: {exc}')
+                continue
+            username, user_rows, written = result
+            if written:
+                exported += 1
+                rows += user_rows
+                self.stdout.write(f'{username}: {", ".join(written)}')
+
+        elapsed = time.perf_counter() - started
+        rate = rows / elapsed if elapsed else 0
+        self.stdout.write(
+            f'{exported} user(s) exported, {len(user_ids) - exported - len(failed)} already done, '
+            f'{len(failed)} failed; {rows} row(s) in {elapsed:.1f}s ({rate:.0f} rows/s) '
+            f'with {options["workers"]} worker(s)'
+        )
+        if failed:
+            raise CommandError(
+                f'{len(failed)} user(s) failed; rerun with --date {stamp} to retry only those'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Successfully wrote exports to {output_dir}'))
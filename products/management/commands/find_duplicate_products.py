@@ -0,0 +1,50 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from products.dedupe import DEFAULT_THRESHOLD, cluster_duplicates, index_product
+from products.models import Product
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'List clusters of products with near-duplicate names, per user'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only check this username')
+        parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                            help=f'Minimum name similarity between 0 and 1 (default {DEFAULT_THRESHOLD})')
+        parser.add_argument('--reindex', action='store_true',
+                            help='Rebuild the name trigram index before checking')
+
+    def handle(self, *args, **options):
+        if not 0 < options['threshold'] <= 1:
+            raise CommandError('--threshold must be between 0 and 1')
+
+        users = User.objects.all()
+        if options['user']:
+            users = users.filter(username=options['user'])
+            if not users.exists():
+                raise CommandError(f'User "{options["user"]}" does not exist')
+
+        total_clusters = 0
+        for user in users:
+            if options['reindex']:
+                for product in Product.objects.filter(user=user).iterator():
+                    index_product(product)
+
+            clusters = cluster_duplicates(user, threshold=options['threshold'])
+            if not clusters:
+                continue
+            names = dict(
+                Product.objects.filter(pk__in=[pk for cluster in clusters for pk in cluster])
+                .values_list('pk', 'name')
+            )
+            self.stdout.write(f'{user.username}:')
+            for cluster in clusters:
+                self.stdout.write('  ' + ', '.join(f'#{pk} "{names[pk]}"' for pk in cluster))
+            total_clusters += len(clusters)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Found {total_clusters} cluster(s) of likely duplicate products')
+        )
@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from products.rollups import rebuild_rollups
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily spending rollups from all products, including archived ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild rollups for this username')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f'User "{options["user"]}" does not exist')
+
+        written = rebuild_rollups(user=user)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully rebuilt {written} daily rollup row(s)')
+        )
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:02
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_rename_weight_value_product_quantity_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('weight_unit', models.CharField(choices=[('g', 'g'), ('kg', 'kg'), ('ml', 'ml'), ('l', 'l'), ('packet', 'packet')], default='g', max_length=10)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('date_added', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-date_added'],
+                'abstract': False,
+                'indexes': [models.Index(fields=['user', '-date_added'], name='products_ar_user_id_c1f224_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:03
+
+import re
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Frozen copy of products.dedupe.name_grams as of this migration.
+NON_WORD = re.compile(r'[^a-z0-9.]+')
+NUMBER_UNIT = re.compile(r'(\d+(?:\.\d+)?) (g|kg|ml|l|packet)\b')
+STRAY_DOT = re.compile(r'(?<!\d)\.|\.(?!\d)')
+QUANTITY = re.compile(r'^\d+(?:\.\d+)?(?:g|kg|ml|l|packet)?$')
+
+
+def name_grams(name):
+    text = ' '.join(STRAY_DOT.sub(' ', NON_WORD.sub(' ', name.lower())).split())
+    text = NUMBER_UNIT.sub(r'\1\2', text)
+    grams = set()
+    for word in text.split():
+        if QUANTITY.match(word):
+            continue
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def index_existing_products(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductNameGram = apps.get_model('products', 'ProductNameGram')
+    grams = []
+    for product in Product.objects.only('pk', 'name', 'user_id').iterator():
+        grams.extend(
+            ProductNameGram(product_id=product.pk, user_id=product.user_id, gram=gram)
+            for gram in name_grams(product.name)
+        )
+    ProductNameGram.objects.bulk_create(grams, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_archivedproduct'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductNameGram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gram', models.CharField(max_length=3)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='name_grams', to='products.product')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'gram'], name='products_pr_user_id_f0aa50_idx')],
+            },
+        ),
+        migrations.RunPython(index_existing_products, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def build_rollups(apps, schema_editor):
+    DailySpend = apps.get_model('products', 'DailySpend')
+    totals = {}
+    for model_name in ('Product', 'ArchivedProduct'):
+        rows = (
+            apps.get_model('products', model_name).objects
+            .annotate(day=TruncDate('date_added', tzinfo=timezone.get_current_timezone()))
+            .values('user_id', 'day', 'weight_unit')
+            .annotate(amount=Sum('amount'), count=Count('pk'))
+            .order_by()
+            .values_list('user_id', 'day', 'weight_unit', 'amount', 'count')
+        )
+        for user_id, day, weight_unit, amount, count in rows:
+            prev_amount, prev_count = totals.get((user_id, day, weight_unit), (0, 0))
+            totals[(user_id, day, weight_unit)] = (prev_amount + amount, prev_count + count)
+    DailySpend.objects.bulk_create([
+        DailySpend(user_id=user_id, day=day, weight_unit=weight_unit,
+                   total_amount=amount, product_count=count)
+        for (user_id, day, weight_unit), (amount, count) in totals.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_productnamegram'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySpend',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('weight_unit', models.CharField(choices=[('g', 'g'), ('kg', 'kg'), ('ml', 'ml'), ('l', 'l'), ('packet', 'packet')], max_length=10)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product_count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['day'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'day', 'weight_unit'), name='unique_daily_spend')],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_dailyspend'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['user', '-date_added'], name='products_pr_user_id_35af12_idx'),
+        ),
+    ]
@@ -6,7 +6,7 @@ from django.utils import timezone
 User = get_user_model()
 
 
-class Product(models.Model):
+class ProductBase(models.Model):
     UNIT_CHOICES = [
         ('g', 'g'),
         ('kg', 'kg'),
@@ -23,6 +23,7 @@ class Product(models.Model):
     date_added = models.DateTimeField(default=timezone.now)
     
     class Meta:
+        abstract = True
         ordering = ['-date_added']
     
     def __str__(self):
@@ -30,3 +31,48 @@ class Product(models.Model):
     
     def get_weight_display(self):
         return f"{self.quantity}{self.weight_unit}"
+
+
+class Product(ProductBase):
+    class Meta(ProductBase.Meta):
+        indexes = [
+            models.Index(fields=['user', '-date_added']),
+        ]
+
+
+# Cold storage for old products, filled by the archive_products command.
+# Columns mirror Product exactly so both tables can be UNIONed in one query.
+class ArchivedProduct(ProductBase):
+    class Meta(ProductBase.Meta):
+        indexes = [
+            models.Index(fields=['user', '-date_added']),
+        ]
+
+
+# Trigram index over product names, maintained by products.signals and
+# queried by products.dedupe to spot near-duplicate entries.
+class ProductNameGram(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='name_grams')
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    gram = models.CharField(max_length=3)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'gram']),
+        ]
+
+
+# Daily spend per user and unit, kept up to date by products.signals so
+# analytics never have to scan Product. Archived rows stay counted.
+class DailySpend(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    day = models.DateField()
+    weight_unit = models.CharField(max_length=10, choices=ProductBase.UNIT_CHOICES)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    product_count = models.IntegerField(default=0)
+    
+    class Meta:
+        ordering = ['day']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day', 'weight_unit'], name='unique_daily_spend'),
+        ]
@@ -0,0 +1,125 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from .models import Product, ArchivedProduct, DailySpend
+
+
+_paused = ContextVar('rollups_paused', default=False)
+
+
+@contextmanager
+def paused_rollups():
+    """Skip rollup updates inside the block, e.g. while moving rows to the archive."""
+    token = _paused.set(True)
+    try:
+        yield
+    finally:
+        _paused.reset(token)
+
+
+def rollup_key(user_id, date_added, weight_unit):
+    return user_id, timezone.localdate(date_added), weight_unit
+
+
+def apply_to_rollup(key, amount, count):
+    """
+    Add `amount` and `count` (either may be negative) to one DailySpend row.
+    A row whose count drops to zero is removed, so analytics never report
+    days or units that no longer have any products.
+    """
+    if _paused.get():
+        return
+    user_id, day, weight_unit = key
+    rows = DailySpend.objects.filter(user_id=user_id, day=day, weight_unit=weight_unit)
+    if rows.update(total_amount=F('total_amount') + amount, product_count=F('product_count') + count):
+        if count < 0:
+            rows.filter(product_count__lte=0).delete()
+        return
+    if count <= 0:
+        return
+    try:
+        with transaction.atomic():
+            DailySpend.objects.create(
+                user_id=user_id, day=day, weight_unit=weight_unit,
+                total_amount=amount, product_count=count,
+            )
+    except IntegrityError:
+        # Another request created the row first.
+        rows.update(total_amount=F('total_amount') + amount, product_count=F('product_count') + count)
+
+
+def daily_totals(*querysets):
+    """
+    Sum product querysets into {(user_id, day, weight_unit): (amount, count)},
+    grouping in the database.
+    """
+    totals = {}
+    for queryset in querysets:
+        rows = (
+            queryset.annotate(day=TruncDate('date_added', tzinfo=timezone.get_current_timezone()))
+            .values('user_id', 'day', 'weight_unit')
+            .annotate(amount=Sum('amount'), count=Count('pk'))
+            .order_by()
+            .values_list('user_id', 'day', 'weight_unit', 'amount', 'count')
+        )
+        for user_id, day, weight_unit, amount, count in rows:
+            prev_amount, prev_count = totals.get((user_id, day, weight_unit), (Decimal('0'), 0))
+            totals[(user_id, day, weight_unit)] = (prev_amount + amount, prev_count + count)
+    return totals
+
+
+def rebuild_rollups(user=None):
+    """
+    Recompute DailySpend from Product and ArchivedProduct.
+
+    Existing rows for `user` (or everyone) are replaced in one transaction.
+    Returns the number of rollup rows written.
+    """
+    querysets = [Product.objects.all(), ArchivedProduct.objects.all()]
+    if user is not None:
+        querysets = [queryset.filter(user=user) for queryset in querysets]
+    totals = daily_totals(*querysets)
+
+    with transaction.atomic():
+        existing = DailySpend.objects.all() if user is None else DailySpend.objects.filter(user=user)
+        existing.delete()
+        DailySpend.objects.bulk_create([
+            DailySpend(user_id=user_id, day=day, weight_unit=weight_unit,
+                       total_amount=amount, product_count=count)
+            for (user_id, day, weight_unit), (amount, count) in totals.items()
+        ], batch_size=1000)
+    return len(totals)
+
+
+def monthly_trends(user, since):
+    """
+    Spend per month and unit for `user` from `since` onwards, read from the
+    rollups only. Returns a list of dicts ordered by month.
+    """
+    rows = (
+        DailySpend.objects.filter(user=user, day__gte=since)
+        .annotate(month=TruncMonth('day'))
+        .values('month', 'weight_unit')
+        .annotate(amount=Sum('total_amount'), count=Sum('product_count'))
+        .order_by('month', 'weight_unit')
+    )
+    cents = Decimal('0.01')
+    months = {}
+    for row in rows:
+        amount = row['amount'].quantize(cents)
+        month = months.setdefault(row['month'], {
+            'month': row['month'].strftime('%Y-%m'),
+            'total_amount': Decimal('0'),
+            'product_count': 0,
+            'units': {},
+        })
+        month['total_amount'] += amount
+        month['product_count'] += row['count']
+        month['units'][row['weight_unit']] = {'amount': amount, 'count': row['count']}
+    return list(months.values())
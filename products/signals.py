@@ -0,0 +1,50 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .dedupe import index_product
+from .models import Product
+from .rollups import apply_to_rollup, rollup_key
+
+
+@receiver(pre_save, sender=Product)
+def remember_previous_values(sender, instance, raw=False, **kwargs):
+    # An edit can move the amount to another day or unit, or rename the
+    # product, so the stored values are needed to update the rollups and
+    # decide whether the name index is stale.
+    instance._previous = None
+    if not raw and instance.pk:
+        instance._previous = (
+            Product.objects.filter(pk=instance.pk)
+            .values('user_id', 'date_added', 'weight_unit', 'amount', 'name')
+            .first()
+        )
+
+
+@receiver(post_save, sender=Product)
+def reindex_product_name(sender, instance, raw=False, **kwargs):
+    # Keep the trigram index in step with the name; rows are dropped by
+    # cascade when the product is deleted or archived.
+    if raw:
+        return
+    previous = getattr(instance, '_previous', None)
+    if previous and previous['name'] == instance.name and previous['user_id'] == instance.user_id:
+        return
+    index_product(instance)
+
+
+@receiver(post_save, sender=Product)
+def add_to_rollup(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous', None)
+    if previous:
+        key = rollup_key(previous['user_id'], previous['date_added'], previous['weight_unit'])
+        apply_to_rollup(key, -previous['amount'], -1)
+    key = rollup_key(instance.user_id, instance.date_added, instance.weight_unit)
+    apply_to_rollup(key, instance.amount, 1)
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_rollup(sender, instance, **kwargs):
+    key = rollup_key(instance.user_id, instance.date_added, instance.weight_unit)
+    apply_to_rollup(key, -instance.amount, -1)
@@ -1,3 +1,465 @@
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from reportlab import rl_config
+
+from utils.pagination import DEFAULT_PER_PAGE
+from .archive import user_products
+from .dedupe import cluster_duplicates, find_similar, is_duplicate, is_duplicate_name
+from .exports import PDF_ROWS_PER_PAGE, write_products_pdf
+from .models import Product, ArchivedProduct, ProductNameGram, DailySpend
+from .rollups import rebuild_rollups
+
+User = get_user_model()
+
+
+def make_product(user, name='Red Apple 1kg', days_ago=0, amount='10.00', **kwargs):
+    kwargs.setdefault('quantity', Decimal('1'))
+    kwargs.setdefault('weight_unit', 'kg')
+    return Product.objects.create(
+        user=user,
+        name=name,
+        amount=Decimal(amount),
+        date_added=timezone.now() - timedelta(days=days_ago),
+        **kwargs
+    )
+
+
+class ArchiveProductsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='store', password='pass')
+        self.other = User.objects.create_user(username='other', password='pass')
+        self.recent = [make_product(self.user, f'recent {i}', days_ago=i) for i in range(1, 9)]
+        self.old = [make_product(self.user, f'old {i}', days_ago=400 + i, amount='2.50') for i in range(3)]
+        make_product(self.other, 'other old', days_ago=500)
+        self.client.force_login(self.user)
+
+    def archive(self, **options):
+        call_command('archive_products', older_than=365, stdout=StringIO(), **options)
+
+    def test_moves_only_rows_older_than_cutoff(self):
+        self.archive(batch_size=2)
+        self.assertEqual(Product.objects.count(), len(self.recent))
+        self.assertEqual(ArchivedProduct.objects.count(), len(self.old) + 1)
+        archived = ArchivedProduct.objects.get(name='old 0')
+        self.assertEqual(archived.user, self.user)
+        self.assertEqual(archived.amount, Decimal('2.50'))
+        self.assertEqual(archived.date_added, self.old[0].date_added)
+
+    def test_rerun_is_a_no_op(self):
+        self.archive()
+        self.archive()
+        self.assertEqual(ArchivedProduct.objects.count(), len(self.old) + 1)
+
+    def test_rejects_negative_age(self):
+        with self.assertRaises(CommandError):
+            call_command('archive_products', older_than=-1, stdout=StringIO())
+
+    def test_list_shows_only_hot_rows_by_default(self):
+        self.archive()
+        response = self.client.get(reverse('product_list'))
+        self.assertEqual(response.context['paginator'].count, len(self.recent))
+        self.assertFalse(any(p.is_archived for p in response.context['products']))
+
+    def test_include_archived_merges_by_date(self):
+        self.archive()
+        products = list(user_products(self.user, include_archived=True))
+        self.assertEqual([p.name for p in products],
+                         [p.name for p in self.recent] + [p.name for p in self.old])
+        for product in products:
+            self.assertIsInstance(product, ArchivedProduct if product.is_archived else Product)
+
+    def test_archived_rows_never_resolve_to_hot_rows(self):
+        self.archive()
+        archived = [p for p in user_products(self.user, include_archived=True) if p.is_archived]
+        archived[0].delete()
+        self.assertEqual(Product.objects.count(), len(self.recent))
+        self.assertEqual(ArchivedProduct.objects.filter(user=self.user).count(), len(self.old) - 1)
+
+    def test_include_archived_paginates_across_both_tables(self):
+        self.archive()
+        response = self.client.get(reverse('product_list'), {'include_archived': '1', 'page': 2})
+        page = list(response.context['products'])
+        self.assertEqual(response.context['paginator'].count, len(self.recent) + len(self.old))
+        self.assertEqual(len(page), len(self.recent) + len(self.old) - DEFAULT_PER_PAGE)
+        self.assertEqual([p.name for p in page if p.is_archived], [p.name for p in self.old])
+        self.assertContains(response, 'include_archived=1')
+
+    def test_search_applies_to_archived_rows(self):
+        self.archive()
+        response = self.client.get(reverse('product_list'), {'include_archived': '1', 'search': 'old'},
+                                   HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        rows = response.json()['products']
+        self.assertEqual([row['name'] for row in rows], [p.name for p in self.old])
+        self.assertTrue(all(row['is_archived'] and row['update_url'] is None for row in rows))
+
+
+class DuplicateProductTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='store', password='pass')
+        self.client.force_login(self.user)
+
+    def merge(self, keep, *duplicates):
+        return self.client.post(reverse('product_merge', args=[keep.pk]),
+                                {'duplicates': [product.pk for product in duplicates]},
+                                HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_names_differing_in_case_punctuation_and_spacing_match(self):
+        self.assertTrue(is_duplicate_name('Red Apple', 'red apple -'))
+        self.assertTrue(is_duplicate_name('Red Apple 1kg', 'red apple - 1 kg'))
+        self.assertTrue(is_duplicate_name('Red Apple 1kg.', 'red apple - 1 kg'))
+        self.assertTrue(is_duplicate_name('Dr. Oetker Custard', 'Dr Oetker Custard'))
+
+    def test_decimal_quantities_in_names_keep_their_point(self):
+        self.assertTrue(is_duplicate_name('Milk 1.5l', 'milk 1.5 l'))
+        self.assertFalse(is_duplicate_name('Milk 1.5l', 'milk 15l'))
+
+    def test_quantities_in_names_must_match(self):
+        self.assertFalse(is_duplicate_name('Red Apple 3kg', 'red apple - 1 kg'))
+
+    def test_quantity_fields_must_match(self):
+        sugar = make_product(self.user, 'Sugar', quantity=Decimal('1'), weight_unit='kg')
+        self.assertTrue(is_duplicate(sugar, make_product(self.user, 'sugar', quantity=Decimal('1.00'))))
+        self.assertFalse(is_duplicate(sugar, make_product(self.user, 'sugar', quantity=Decimal('5'))))
+        self.assertFalse(is_duplicate(sugar, make_product(self.user, 'sugar', weight_unit='g')))
+
+    def test_find_similar_uses_index_and_quantity_fields(self):
+        apple = make_product(self.user, 'Red Apple')
+        make_product(self.user, 'Red Apple', quantity=Decimal('3'))
+        make_product(self.user, 'Red Apple', weight_unit='g')
+        make_product(self.user, 'Green Tea')
+        matches = find_similar(self.user, 'red apple -', Decimal('1'), 'kg')
+        self.assertEqual([product for product, score in matches], [apple])
+
+    def test_different_items_from_the_same_brand_do_not_match(self):
+        make_product(self.user, 'ponkathir puttupodi')
+        make_product(self.user, 'ponkathir rice podi')
+        make_product(self.user, 'ponkathir white aval', weight_unit='packet')
+        self.assertEqual(cluster_duplicates(self.user), [])
+
+    def test_cluster_finds_duplicates_sharing_common_words(self):
+        first = make_product(self.user, 'Basmati Rice')
+        second = make_product(self.user, 'basmati rice -')
+        for i in range(210):
+            make_product(self.user, f'Basmati Rice Brand{i}')
+        clusters = cluster_duplicates(self.user)
+        self.assertTrue(any(first.pk in cluster and second.pk in cluster for cluster in clusters))
+
+    def test_cluster_separates_quantities(self):
+        make_product(self.user, 'Sugar', quantity=Decimal('1'))
+        make_product(self.user, 'sugar', quantity=Decimal('5'))
+        self.assertEqual(cluster_duplicates(self.user), [])
+
+    def test_cluster_matches_pairwise_comparison(self):
+        rows = [('Red Apple', '1', 'kg'), ('red apple -', '1', 'kg'), ('Red Apples', '1', 'kg'),
+                ('Red Apple', '2', 'kg'), ('Green Apple', '1', 'kg'), ('Sugar', '1', 'kg'),
+                ('sugar', '1', 'kg'), ('Sugar', '500', 'g'), ('Milk', '500', 'ml'), ('Milk Powder', '500', 'g')]
+        products = [make_product(self.user, name, quantity=Decimal(quantity), weight_unit=unit)
+                    for name, quantity, unit in rows]
+        pairs = {
+            (a.pk, b.pk) for a in products for b in products
+            if a.pk < b.pk and is_duplicate(a, b)
+        }
+        clustered = {
+            (a, b) for cluster in cluster_duplicates(self.user)
+            for a in cluster for b in cluster if a < b
+        }
+        self.assertEqual(clustered, pairs)
+        self.assertEqual(len(pairs), 4)
+
+    def test_index_follows_renames_only(self):
+        product = make_product(self.user, 'Red Apple')
+        gram_ids = set(ProductNameGram.objects.filter(product=product).values_list('pk', flat=True))
+        product.amount = Decimal('12.00')
+        product.save()
+        self.assertEqual(set(ProductNameGram.objects.filter(product=product).values_list('pk', flat=True)), gram_ids)
+        product.name = 'Green Tea'
+        product.save()
+        self.assertEqual(find_similar(self.user, 'Red Apple', Decimal('1'), 'kg'), [])
+        self.assertEqual(len(find_similar(self.user, 'green tea', Decimal('1'), 'kg')), 1)
+
+    def test_create_view_warns_about_duplicates(self):
+        make_product(self.user, 'Sugar')
+        data = {'name': 'sugar', 'quantity': '1', 'weight_unit': 'kg', 'amount': '47'}
+        response = self.client.post(reverse('product_create'), data, follow=True)
+        self.assertContains(response, 'looks like a duplicate of &quot;Sugar&quot;')
+
+    def test_create_view_ignores_other_quantities(self):
+        make_product(self.user, 'Sugar')
+        for quantity, unit in [('5', 'kg'), ('2', 'g')]:
+            data = {'name': 'sugar', 'quantity': quantity, 'weight_unit': unit, 'amount': '230'}
+            response = self.client.post(reverse('product_create'), data, follow=True)
+            self.assertNotContains(response, 'looks like a duplicate')
+
+    def test_merge_deletes_duplicates(self):
+        keep = make_product(self.user, 'Red Apple')
+        duplicate = make_product(self.user, 'red apple -')
+        self.assertEqual(self.merge(keep, duplicate).json(), {'kept': keep.pk, 'merged': 1})
+        self.assertEqual(list(Product.objects.all()), [keep])
+
+    def test_merge_rejects_products_that_are_not_duplicates(self):
+        keep = make_product(self.user, 'Red Apple')
+        duplicate = make_product(self.user, 'red apple -')
+        unrelated = make_product(self.user, 'Green Tea')
+        self.assertEqual(self.merge(keep, duplicate, unrelated).status_code, 400)
+        self.assertEqual(Product.objects.count(), 3)
+
+    def test_merge_rejects_other_quantities(self):
+        keep = make_product(self.user, 'Sugar', amount='47.00')
+        bigger = make_product(self.user, 'sugar', amount='230.00', quantity=Decimal('5'))
+        self.assertEqual(self.merge(keep, bigger).status_code, 400)
+        self.assertTrue(Product.objects.filter(pk=bigger.pk).exists())
+        self.assertEqual(DailySpend.objects.get(user=self.user).total_amount, Decimal('277.00'))
+
+    def test_merge_ignores_other_users_products(self):
+        other = User.objects.create_user(username='other', password='pass')
+        keep = make_product(self.user, 'Red Apple')
+        theirs = make_product(other, 'Red Apple')
+        self.merge(keep, theirs)
+        self.assertTrue(Product.objects.filter(pk=theirs.pk).exists())
+
+    def test_find_duplicate_products_command(self):
+        make_product(self.user, 'Red Apple')
+        make_product(self.user, 'red apple -')
+        make_product(self.user, 'red apple', quantity=Decimal('2'))
+        out = StringIO()
+        call_command('find_duplicate_products', '--reindex', stdout=out)
+        self.assertIn('Found 1 cluster(s)', out.getvalue())
+
+
+class ProductPDFExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='store', password='pass')
+        self.client.force_login(self.user)
+
+    def render_pages(self, count):
+        products = [
+            Product(user=self.user, name=f'item {i:03d}', quantity=Decimal('1'), weight_unit='kg',
+                    amount=Decimal('1.50'), date_added=timezone.now())
+            for i in range(count)
+        ]
+        out = BytesIO()
+        # Uncompressed page streams keep the drawn text searchable.
+        with mock.patch.object(rl_config, 'pageCompression', 0):
+            write_products_pdf(out, iter(products), count, Decimal('1.50') * count)
+        return re.findall(rb'stream\r?\n(.*?)endstream', out.getvalue(), re.S)
+
+    def assertFooter(self, page, count, amount):
+        self.assertIn(b'(Total Products:)', page)
+        self.assertIn(f'{count}'.encode(), page.split(b'(Total Products:)')[1])
+        self.assertIn(f'Rs. {amount}'.encode(), page)
+
+    def test_empty_export_is_one_page_with_header_and_totals(self):
+        pages = self.render_pages(0)
+        self.assertEqual(len(pages), 1)
+        self.assertIn(b'(Product Name)', pages[0])
+        self.assertFooter(pages[0], 0, '0.00')
+
+    def test_full_first_page_pushes_totals_to_next_page(self):
+        pages = self.render_pages(PDF_ROWS_PER_PAGE)
+        self.assertEqual(len(pages), 2)
+        self.assertIn(f'(item {PDF_ROWS_PER_PAGE - 1:03d})'.encode(), pages[0])
+        self.assertNotIn(b'(Total Products:)', pages[0])
+        self.assertNotIn(b'(Product Name)', pages[1])
+        self.assertFooter(pages[1], PDF_ROWS_PER_PAGE, '45.00')
+
+    def test_overflow_row_starts_a_new_page_with_header(self):
+        pages = self.render_pages(PDF_ROWS_PER_PAGE + 1)
+        self.assertEqual(len(pages), 2)
+        self.assertNotIn(f'(item {PDF_ROWS_PER_PAGE:03d})'.encode(), pages[0])
+        self.assertIn(b'(Product Name)', pages[1])
+        self.assertIn(f'(item {PDF_ROWS_PER_PAGE:03d})'.encode(), pages[1])
+        self.assertFooter(pages[1], PDF_ROWS_PER_PAGE + 1, '46.50')
+
+    def test_full_later_page_keeps_totals_on_it(self):
+        pages = self.render_pages(PDF_ROWS_PER_PAGE * 2)
+        self.assertEqual(len(pages), 2)
+        self.assertFooter(pages[1], PDF_ROWS_PER_PAGE * 2, '90.00')
+
+    def test_view_totals_come_from_all_rows(self):
+        for i in range(3):
+            make_product(self.user, f'item {i}', amount='2.25')
+        with mock.patch.object(rl_config, 'pageCompression', 0):
+            response = self.client.get(reverse('product_export_pdf'))
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn('attachment', response['Content-Disposition'])
+        content = b''.join(response.streaming_content)
+        self.assertIn(b'Rs. 6.75', content)
+
+
+class DailySpendRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='store', password='pass')
+        self.client.force_login(self.user)
+
+    def rollups(self):
+        return {
+            (row.day, row.weight_unit): (row.total_amount, row.product_count)
+            for row in DailySpend.objects.filter(user=self.user)
+        }
+
+    def rebuilt(self):
+        rebuild_rollups(self.user)
+        return self.rollups()
+
+    def test_create_adds_to_days_total(self):
+        first = make_product(self.user, amount='10.00')
+        make_product(self.user, amount='2.50')
+        day = timezone.localdate(first.date_added)
+        self.assertEqual(self.rollups(), {(day, 'kg'): (Decimal('12.50'), 2)})
+
+    def test_edit_moves_amount_between_rollups(self):
+        product = make_product(self.user, amount='10.00')
+        old_day = timezone.localdate(product.date_added)
+        product.amount = Decimal('4.00')
+        product.weight_unit = 'g'
+        product.date_added -= timedelta(days=3)
+        product.save()
+        new_day = timezone.localdate(product.date_added)
+        self.assertEqual(self.rollups(), {(new_day, 'g'): (Decimal('4.00'), 1)})
+        self.assertFalse(DailySpend.objects.filter(day=old_day).exists())
+        self.assertEqual(self.rollups(), self.rebuilt())
+
+    def test_delete_removes_amount(self):
+        keep = make_product(self.user, amount='10.00')
+        make_product(self.user, amount='3.00').delete()
+        self.assertEqual(self.rollups(), {(timezone.localdate(keep.date_added), 'kg'): (Decimal('10.00'), 1)})
+
+    def test_analytics_drops_units_whose_products_were_all_removed(self):
+        make_product(self.user, amount='10.00')
+        make_product(self.user, weight_unit='g', amount='3.00').delete()
+        edited = make_product(self.user, weight_unit='ml', amount='4.00')
+        edited.weight_unit = 'kg'
+        edited.save()
+
+        data = self.client.get(reverse('product_analytics'), {'months': 1}).json()
+        self.assertEqual(data['months'], [{
+            'month': timezone.localdate().strftime('%Y-%m'),
+            'total_amount': '14.00',
+            'product_count': 2,
+            'units': {'kg': {'amount': '14.00', 'count': 2}},
+        }])
+
+    def test_analytics_is_empty_after_merging_away_the_last_product(self):
+        keep = make_product(self.user, 'Sugar', amount='47.00')
+        duplicate = make_product(self.user, 'sugar', amount='47.00')
+        self.client.post(reverse('product_merge', args=[keep.pk]), {'duplicates': [duplicate.pk]})
+        keep.delete()
+        self.assertFalse(DailySpend.objects.exists())
+        data = self.client.get(reverse('product_analytics'), {'months': 1}).json()
+        self.assertEqual(data['months'], [])
+
+    def test_archiving_leaves_rollups_alone(self):
+        make_product(self.user, days_ago=400, amount='7.00')
+        make_product(self.user, days_ago=1, amount='1.00')
+        before = self.rollups()
+        call_command('archive_products', older_than=365, stdout=StringIO())
+        self.assertEqual(ArchivedProduct.objects.count(), 1)
+        self.assertEqual(self.rollups(), before)
+        self.assertEqual(self.rebuilt(), before)
+
+    def test_rebuild_rollups_command(self):
+        make_product(self.user, amount='5.00')
+        DailySpend.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_rollups', stdout=out)
+        self.assertIn('rebuilt 1 daily rollup row(s)', out.getvalue())
+        self.assertEqual(sum(total for total, count in self.rollups().values()), Decimal('5.00'))
+
+    def test_analytics_covers_requested_months(self):
+        today = timezone.localdate()
+        this_month = today.replace(day=1)
+        last_month = (this_month - timedelta(days=1)).replace(day=1)
+        two_months_ago = (last_month - timedelta(days=1)).replace(day=1)
+        for day, amount in [(this_month, '1.00'), (last_month, '2.00'), (two_months_ago, '4.00')]:
+            DailySpend.objects.create(user=self.user, day=day, weight_unit='kg',
+                                      total_amount=Decimal(amount), product_count=1)
+
+        data = self.client.get(reverse('product_analytics'), {'months': 2}).json()
+        self.assertEqual(data['since'], last_month.isoformat())
+        self.assertEqual([m['month'] for m in data['months']],
+                         [last_month.strftime('%Y-%m'), this_month.strftime('%Y-%m')])
+        self.assertEqual(data['months'][0]['total_amount'], '2.00')
+        self.assertEqual(data['months'][0]['units']['kg'], {'amount': '2.00', 'count': 1})
+
+    def test_analytics_defaults_to_a_year(self):
+        data = self.client.get(reverse('product_analytics'), {'months': 'abc'}).json()
+        today = timezone.localdate()
+        month_index = today.year * 12 + today.month - 12
+        self.assertEqual(data['since'], f'{month_index // 12:04d}-{month_index % 12 + 1:02d}-01')
+
+
+class ExportAllUsersTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.bob = User.objects.create_user(username='bob', password='pass')
+        make_product(self.alice, 'Sugar 1kg')
+        make_product(self.bob, 'Rice 1kg')
+        self.output_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.output_dir)
+
+    def export(self, **options):
+        call_command('export_all_users', str(self.output_dir), workers=1, date='20250101',
+                     stdout=StringIO(), stderr=StringIO(), **options)
+
+    def files(self):
+        return sorted(path.name for path in self.output_dir.iterdir())
+
+    def test_writes_both_formats_per_user(self):
+        self.export()
+        self.assertEqual(self.files(), [
+            'products_alice_20250101.pdf', 'products_alice_20250101.xlsx',
+            'products_bob_20250101.pdf', 'products_bob_20250101.xlsx',
+        ])
+
+    def test_resume_only_redoes_failed_exports(self):
+        from products import exports
+
+        real_writer = exports.write_products_excel
+
+        def fail_for_bob(out, products, total_count, total_amount):
+            products = list(products)
+            if products and products[0].user_id == self.bob.pk:
+                raise RuntimeError('disk full')
+            real_writer(out, products, total_count, total_amount)
+
+        with mock.patch.object(exports, 'write_products_excel', fail_for_bob):
+            with self.assertRaises(CommandError):
+                self.export()
+        self.assertEqual(self.files(), [
+            'products_alice_20250101.pdf', 'products_alice_20250101.xlsx',
+            'products_bob_20250101.pdf',
+        ])
+
+        finished = {path.name: path.stat().st_mtime_ns for path in self.output_dir.iterdir()}
+        with mock.patch.object(exports, 'write_products_pdf') as pdf_writer:
+            self.export()
+        pdf_writer.assert_not_called()
+        self.assertIn('products_bob_20250101.xlsx', self.files())
+        for name, mtime in finished.items():
+            self.assertEqual((self.output_dir / name).stat().st_mtime_ns, mtime)
 
-# Create your tests here.
+    def test_worker_module_imports_before_django_setup(self):
+        # Spawned workers unpickle their entry points before django.setup().
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='rs.settings')
+        result = subprocess.run(
+            [sys.executable, '-c', 'import products.batch_export'],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
@@ -1,4 +1,5 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.utils import timezone
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 from django.db.models import Q
@@ -6,16 +7,18 @@ from django.core.paginator import Paginator
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView, View
 from utils.pagination import paginate_queryset  # make sure path is correct
 from django.urls import reverse_lazy
-from django.http import HttpResponseRedirect, HttpResponse, JsonResponse
+from django.http import HttpResponseRedirect, HttpResponse, JsonResponse, FileResponse
 from .models import Product
 from .forms import ProductForm
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment
+from .archive import user_product_totals, user_products, wants_archived
+from .dedupe import find_similar, merge_products
+from .rollups import monthly_trends
+from .exports import write_products_excel, write_products_pdf
 from datetime import datetime
+import tempfile
+
+# Reports larger than this are spooled to disk while rendering.
+PDF_SPOOL_MAX_SIZE = 5 * 1024 * 1024
 
 class AdminRequiredMixin(LoginRequiredMixin):
     def dispatch(self, request, *args, **kwargs):
@@ -37,11 +40,9 @@ class ProductListView(AdminRequiredMixin, ListView):
     paginate_by = None
 
     def get_queryset(self):
-        queryset = Product.objects.filter(user=self.request.user)
         search = self.request.GET.get('search')
-        if search:
-            queryset = queryset.filter(Q(name__icontains=search))
-        return queryset.order_by('-date_added')
+        filters = Q(name__icontains=search) if search else None
+        return user_products(self.request.user, include_archived=wants_archived(self.request), filters=filters)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -51,6 +52,7 @@ class ProductListView(AdminRequiredMixin, ListView):
         context['paginator'] = page_obj.paginator
         context['is_paginated'] = True
         context['search_term'] = self.request.GET.get('search', '')
+        context['include_archived'] = wants_archived(self.request)
         return context
 
     def get(self, request, *args, **kwargs):
@@ -68,8 +70,9 @@ class ProductListView(AdminRequiredMixin, ListView):
                     'weight': product.get_weight_display(),
                     'amount': product.amount,
                     'date_added': product.date_added.strftime('%b %d, %Y %H:%M'),
-                    'update_url': request.build_absolute_uri(f'/products/{product.pk}/update/'),
-                    'delete_url': request.build_absolute_uri(f'/products/{product.pk}/delete/'),
+                    'is_archived': product.is_archived,
+                    'update_url': None if product.is_archived else request.build_absolute_uri(f'/products/{product.pk}/update/'),
+                    'delete_url': None if product.is_archived else request.build_absolute_uri(f'/products/{product.pk}/delete/'),
                 })
             
             return JsonResponse({'products': products_data})
@@ -89,7 +92,13 @@ class ProductCreateView(AdminRequiredMixin, CreateView):
     def form_valid(self, form):
         form.instance.user = self.request.user
         messages.success(self.request, 'Product added successfully.')
-        return super().form_valid(form)
+        response = super().form_valid(form)
+        similar = find_similar(self.request.user, self.object.name, self.object.quantity,
+                               self.object.weight_unit, exclude_pk=self.object.pk)
+        if similar:
+            names = ', '.join(f'"{product.name}"' for product, score in similar)
+            messages.warning(self.request, f'This looks like a duplicate of {names}.')
+        return response
     
     def form_invalid(self, form):
         messages.error(self.request, 'Form error. Please correct the fields.')
@@ -127,128 +136,74 @@ class ProductDeleteView(AdminRequiredMixin, DeleteView):
         return super().delete(request, *args, **kwargs)
 
 
+class ProductMergeView(AdminRequiredMixin, View):
+    def post(self, request, pk, *args, **kwargs):
+        keep = get_object_or_404(Product, pk=pk, user=request.user)
+        ids = [i for i in request.POST.getlist('duplicates') if i.isdigit()]
+        is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+        try:
+            merged = merge_products(keep, Product.objects.filter(user=request.user, pk__in=ids))
+        except ValueError as exc:
+            if is_ajax:
+                return JsonResponse({'error': str(exc)}, status=400)
+            messages.error(request, str(exc))
+            return redirect('product_list')
+
+        if is_ajax:
+            return JsonResponse({'kept': keep.pk, 'merged': merged})
+
+        messages.success(request, f'Merged {merged} duplicate(s) into "{keep.name}".')
+        return redirect('product_list')
+
+
+class ProductAnalyticsView(AdminRequiredMixin, View):
+    max_months = 60
+
+    def get(self, request, *args, **kwargs):
+        months = request.GET.get('months', '12')
+        months = min(int(months), self.max_months) if months.isdigit() and int(months) > 0 else 12
+
+        # First day of the month `months - 1` months before this one.
+        today = timezone.localdate()
+        month_index = today.year * 12 + today.month - 1 - (months - 1)
+        since = today.replace(year=month_index // 12, month=month_index % 12 + 1, day=1)
+
+        return JsonResponse({
+            'since': since.isoformat(),
+            'months': monthly_trends(request.user, since),
+        })
+
+
 class ProductExportPDFView(AdminRequiredMixin, View):
     def get(self, request, *args, **kwargs):
-        products = Product.objects.filter(user=request.user).order_by('-date_added')
-        
-        # Create PDF
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="products_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf"'
-        
-        doc = SimpleDocTemplate(response, pagesize=letter)
-        elements = []
-        
-        # Add title
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=16,
-            textColor=colors.HexColor('#1f77b4'),
-            spaceAfter=20,
-            alignment=1
+        include_archived = wants_archived(request)
+        products = user_products(request.user, include_archived=include_archived)
+        total_count, total_amount = user_product_totals(request.user, include_archived=include_archived)
+
+        # Render into a spooled temp file so large reports spill to disk
+        # instead of being held in memory, then stream it out.
+        pdf_file = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_SIZE)
+        write_products_pdf(pdf_file, products.iterator(), total_count, total_amount)
+        pdf_file.seek(0)
+
+        return FileResponse(
+            pdf_file,
+            as_attachment=True,
+            filename=f'products_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf',
+            content_type='application/pdf',
         )
-        elements.append(Paragraph("AFC Bank Supermarket Products", title_style))
-        elements.append(Spacer(1, 12))
-        
-        # Create table data
-        data = [['Product Name', 'Quantity', 'Amount (Rs.)', 'Date Added']]
-        for product in products:
-            data.append([
-                product.name,
-                product.get_weight_display(),
-                f"{product.amount}",
-                product.date_added.strftime('%b %d, %Y')
-            ])
-        
-        # Create table
-        table = Table(data, colWidths=[150, 100, 100, 120])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1f77b4')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f0f0f0')])
-        ]))
-        
-        elements.append(table)
-        elements.append(Spacer(1, 20))
-        
-        # Add summary
-        summary_style = ParagraphStyle(
-            'Summary',
-            parent=styles['Normal'],
-            fontSize=10,
-            textColor=colors.grey,
-        )
-        total_amount = sum(float(p.amount) for p in products)
-        elements.append(Paragraph(f"<b>Total Products:</b> {products.count()}", summary_style))
-        elements.append(Paragraph(f"<b>Total Value:</b> Rs. {total_amount:.2f}", summary_style))
-        elements.append(Paragraph(f"<b>Generated on:</b> {datetime.now().strftime('%B %d, %Y %I:%M %p')}", summary_style))
-        
-        doc.build(elements)
-        return response
 
 
 class ProductExportExcelView(AdminRequiredMixin, View):
     def get(self, request, *args, **kwargs):
-        products = Product.objects.filter(user=request.user).order_by('-date_added')
-        
-        # Create Excel workbook
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Products"
-        
-        # Add headers
-        headers = ['Product Name', 'Quantity', 'Amount (Rs.)', 'Date Added']
-        ws.append(headers)
-        
-        # Style headers
-        header_fill = PatternFill(start_color='1f77b4', end_color='1f77b4', fill_type='solid')
-        header_font = Font(bold=True, color='FFFFFF', size=12)
-        
-        for cell in ws[1]:
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-        
-        # Add data
-        for product in products:
-            ws.append([
-                product.name,
-                product.get_weight_display(),
-                float(product.amount),
-                product.date_added.strftime('%b %d, %Y')
-            ])
-        
-        # Format columns
-        ws.column_dimensions['A'].width = 25
-        ws.column_dimensions['B'].width = 15
-        ws.column_dimensions['C'].width = 15
-        ws.column_dimensions['D'].width = 15
-        
-        # Add summary section
-        summary_row = len(products) + 3
-        ws[f'A{summary_row}'] = 'Total Products:'
-        ws[f'B{summary_row}'] = products.count()
-        
-        ws[f'A{summary_row + 1}'] = 'Total Value (Rs.):'
-        total_amount = sum(float(p.amount) for p in products)
-        ws[f'B{summary_row + 1}'] = total_amount
-        
-        # Make summary bold
-        for row in ws[summary_row:summary_row + 2]:
-            for cell in row:
-                cell.font = Font(bold=True)
+        include_archived = wants_archived(request)
+        products = user_products(request.user, include_archived=include_archived)
+        total_count, total_amount = user_product_totals(request.user, include_archived=include_archived)
         
         # Return as download
         response = HttpResponse(
             content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
         )
         response['Content-Disposition'] = f'attachment; filename="products_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx"'
-        wb.save(response)
-        return response
\ No newline at end of file
+        write_products_excel(response, products.iterator(), total_count, total_amount)
+        return response